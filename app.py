@@ -1,7 +1,16 @@
 # %%
+import glob
+import hashlib
+import os
+import tempfile
+import time
+import urllib.request
+
 import streamlit as st
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import plotly.express as px
 
 from datetime import date, timedelta, datetime
@@ -9,6 +18,33 @@ from datetime import date, timedelta, datetime
 from config import Configurations 
 from graphs import Graph 
 # %%
+# bounded: loads without a source modification time each get a new df_version
+@st.cache_data(show_spinner=False, max_entries=64)
+def _pnl_cached(_df: pd.DataFrame, df_version: str, month: int, year: int) -> pd.DataFrame:
+    """
+    Profit and loss by (Nature of Record, Account) for one month.
+    _df is not hashed by Streamlit; df_version identifies the data instead.
+    """
+    mask = _df["YearMonth"] == (year - 1970) * 12 + (month - 1)
+
+    df_m = _df[mask]
+
+    # Arrow hash group-by sum; pivot_wider is not used as it rejects repeated keys
+    # instead of summing them. Result stays long (Nature of Record, Account) -> Amount,
+    # unstack at display time if a wide view is needed
+    keys = ["Nature of Record", "Account"]
+    table = pa.Table.from_pandas(
+        df_m[keys + ["Amount"]].dropna(subset=keys), preserve_index=False
+    )
+    pnl = (
+        table.group_by(keys)
+        .aggregate([("Amount", "sum", pc.ScalarAggregateOptions(min_count=0))])
+        .to_pandas()
+        .rename(columns={"Amount_sum": "Amount"})
+        .set_index(keys)
+    )
+    return pnl
+
 class Finance:
     
     AMOUNT_COLS = [
@@ -43,14 +79,30 @@ class Finance:
         "Transfer-Out Note",
     ]
 
+    RAW_DTYPES = {
+        "Nature of Record": "string[pyarrow]",
+        **dict.fromkeys(AMOUNT_COLS, "double[pyarrow]"),
+        **dict.fromkeys(ACCOUNT_COLS + SOURCE_COLS + DESC_COLS, "string[pyarrow]"),
+    }
+
+    # Google Forms response timestamp
+    TIMESTAMP_FORMAT = "%m/%d/%Y %H:%M:%S"
+
+    # sources whose HEAD response carried neither ETag nor Last-Modified
+    _UNVALIDATED_URLS: set[str] = set()
+
     def __init__(self):
         self.raw = None
         self.df = None
+        self.version = None
 
     # ---------- public API ----------
 
     def run(self):
-        """Main pipeline: load, transform, type-cast."""
+        """
+        Main pipeline: load, transform, type-cast.
+        Each step consumes the previous step's frame, so they run in order in-process.
+        """
         self._load_raw()
         self._combine_columns()
         self._split_transfers()
@@ -59,26 +111,124 @@ class Finance:
         return self.df
    
     def monthly_profit_and_loss(self, month: int, year: int):
-        mask = (
-            (self.df["Timestamp"].dt.year == year) &
-            (self.df["Timestamp"].dt.month == month)
-        )
+        """Cached per (data version, month, year); closed months are only pivoted once."""
+        return _pnl_cached(self.df, self.version, month, year)
 
-        df_m = self.df[mask].copy()
-        print(df_m)
-        pnl = df_m.pivot_table(
-            index=["Nature of Record", "Account"],
-            values="Amount",
-            aggfunc="sum",
-            fill_value=0.0
-        )
-        print(pnl)
-        return pnl
+    @staticmethod
+    def cumsum_by_group(codes: np.ndarray, amt: np.ndarray, n_groups: int) -> np.ndarray:
+        """
+        Running sum of amt within each group code, in row order, like groupby(...).cumsum().
+        Rows with a NaN amount or a null (-1) code come out NaN and are skipped by the sum.
+        """
+        out = np.full(len(amt), np.nan)
+        rows = np.flatnonzero((codes >= 0) & ~np.isnan(amt))
+
+        # stable sort on the small integer codes keeps row order within each group,
+        # so every group becomes one contiguous run of row positions
+        rows = rows[np.argsort(codes[rows], kind="stable")]
+        ends = np.cumsum(np.bincount(codes[rows], minlength=n_groups))
+
+        start = 0
+        for end in ends:
+            group_rows = rows[start:end]
+            out[group_rows] = np.cumsum(amt[group_rows])
+            start = end
+        return out
     # ---------- internal steps ----------
 
     # --- Data Processing --- #
     def _load_raw(self):
-        self.raw = pd.read_excel(Configurations.URL, sheet_name=Configurations.SHEET)
+        """Read the sheet, reusing the local Parquet copy while the source is unchanged."""
+        validator = self._source_validator()
+        cache_path = self._cache_path(validator) if validator is not None else None
+
+        # identifies the loaded data for caches downstream; an unknown source version means a fresh fetch
+        self.version = cache_path or f"{Configurations.url()}@{time.time_ns()}"
+
+        if cache_path is not None and os.path.exists(cache_path):
+            try:
+                self.raw = pd.read_parquet(cache_path, engine="pyarrow", dtype_backend="pyarrow")
+                return
+            except (OSError, ValueError, TypeError):
+                # unreadable copy: drop it and fall back to the sheet
+                try:
+                    os.remove(cache_path)
+                except OSError:
+                    pass
+
+        self.raw = pd.read_excel(
+            Configurations.url(),
+            sheet_name=Configurations.SHEET,
+            engine="calamine",
+            dtype=self.RAW_DTYPES,
+            dtype_backend="pyarrow",
+        )
+
+        # without a source validator the copy could never be matched again
+        if cache_path is not None:
+            self._write_cache(cache_path)
+
+    def _write_cache(self, cache_path: str):
+        """Atomically write self.raw to cache_path and drop copies of older source versions."""
+        tmp_path = None
+
+        # a failed cache write only costs the next cold load, never this one
+        try:
+            os.makedirs(Configurations.CACHE_DIR, exist_ok=True)
+            # per-writer temp file, so concurrent app processes never share one
+            with tempfile.NamedTemporaryFile(
+                dir=Configurations.CACHE_DIR, suffix=".tmp", delete=False
+            ) as tmp:
+                tmp_path = tmp.name
+                self.raw.to_parquet(tmp, engine="pyarrow", compression="zstd")
+            os.replace(tmp_path, cache_path)
+        except (OSError, ValueError, TypeError):
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        prefix = cache_path.rsplit("-", 1)[0]
+        for stale_path in glob.glob(f"{prefix}-*.parquet"):
+            if stale_path != cache_path:
+                try:
+                    os.remove(stale_path)
+                except OSError:
+                    pass
+
+    def _cache_path(self, validator: str) -> str:
+        """<source key>-<validator key>.parquet, so each source version gets its own file."""
+        source_key = hashlib.sha256(
+            f"{Configurations.url()}#{Configurations.SHEET}".encode()
+        ).hexdigest()[:16]
+        validator_key = hashlib.sha256(validator.encode()).hexdigest()[:16]
+        return os.path.join(Configurations.CACHE_DIR, f"{source_key}-{validator_key}.parquet")
+
+    def _source_validator(self):
+        """
+        String identifying the current version of the source, or None if unknown:
+        file mtime for local paths, ETag and Last-Modified from a HEAD for URLs.
+        """
+        url = Configurations.url()
+
+        if not url.startswith(("http://", "https://")):
+            return str(os.stat(url).st_mtime_ns) if os.path.exists(url) else None
+
+        # the HEAD round trip is only paid while it can produce a validator
+        if url in Finance._UNVALIDATED_URLS:
+            return None
+
+        try:
+            request = urllib.request.Request(url, method="HEAD")
+            with urllib.request.urlopen(request, timeout=10) as response:
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except (OSError, ValueError):
+            return None
+
+        if not etag and not last_modified:
+            Finance._UNVALIDATED_URLS.add(url)
+            return None
+        return f"ETag={etag or ''};Last-Modified={last_modified or ''}"
 
     def _combine_columns(self):
         raw = self.raw
@@ -88,10 +238,10 @@ class Finance:
         raw["Transfer-Out Amount"] = -raw["Transfer-Out Amount"]
 
         # coalesce across columns using first non-null
-        raw["Amount"] = raw[self.AMOUNT_COLS].bfill(axis=1).iloc[:, 0]
-        raw["Account"] = raw[self.ACCOUNT_COLS].bfill(axis=1).iloc[:, 0]
-        raw["Source"] = raw[self.SOURCE_COLS].bfill(axis=1).iloc[:, 0]
-        raw["Description"] = raw[self.DESC_COLS].bfill(axis=1).iloc[:, 0]
+        raw["Amount"] = self._first_non_null(self.AMOUNT_COLS, dtype="float64")
+        raw["Account"] = self._first_non_null(self.ACCOUNT_COLS)
+        raw["Source"] = self._first_non_null(self.SOURCE_COLS)
+        raw["Description"] = self._first_non_null(self.DESC_COLS)
 
         # drop original cols
         drop_cols = (
@@ -102,34 +252,38 @@ class Finance:
         )
         self.raw = raw.drop(columns=drop_cols)
 
+    def _first_non_null(self, cols: list[str], dtype=None) -> np.ndarray:
+        """Row-wise first non-null value across cols, in one pass over a 2D array."""
+        if dtype is None:
+            arr = self.raw[cols].to_numpy()
+        else:
+            arr = self.raw[cols].to_numpy(dtype=dtype, na_value=np.nan)
+
+        idx = pd.notna(arr).argmax(axis=1)
+        return arr[np.arange(len(arr)), idx]
+
     def _split_transfers(self):
         raw = self.raw
 
         is_transfer = raw["Nature of Record"].str.strip().fillna("") == "Transfer"
-        transfer_rows = raw[is_transfer].copy()
-        non_transfer_rows = raw[~is_transfer].copy()
-
-        # expense leg
-        transfer_expense = transfer_rows.copy()
-        transfer_expense["Amount"] = -transfer_expense["Amount"]
-        
-        temp = transfer_expense["Source"]
-        transfer_expense["Source"] = transfer_expense["Account"]
-        transfer_expense["Account"] = temp
-
-        transfer_expense["Nature of Record"] = "Transfer-Out"
-
-        # income leg
-        transfer_income = transfer_rows.copy()
-        transfer_income["Amount"] = transfer_income["Amount"]
-        transfer_income["Nature of Record"] = "Transfer-In"
-
-        split_transfers = pd.concat(
-            [transfer_expense, transfer_income], ignore_index=True
-        )
+        tr = raw.loc[is_transfer]
+        n = len(tr)
+
+        # both legs built straight from column arrays: expense leg first, then income leg
+        legs = {col: np.tile(tr[col].to_numpy(), 2) for col in tr.columns}
+
+        amount = tr["Amount"].to_numpy()
+        account = tr["Account"].to_numpy()
+        source = tr["Source"].to_numpy()
+
+        # expense leg negates Amount and swaps Source/Account
+        legs["Amount"] = np.concatenate([-amount, amount])
+        legs["Source"] = np.concatenate([account, source])
+        legs["Account"] = np.concatenate([source, account])
+        legs["Nature of Record"] = np.repeat(["Transfer-Out", "Transfer-In"], n)
 
         self.df = pd.concat(
-            [non_transfer_rows, split_transfers], ignore_index=True
+            [raw.loc[~is_transfer], pd.DataFrame(legs)], ignore_index=True
         )
 
     def _finalise_schema(self):
@@ -137,18 +291,36 @@ class Finance:
         df = df[
             ["Timestamp", "Nature of Record", "Amount", "Source", "Account", "Description"]
         ]
-        df = df.sort_values("Timestamp", ascending=True).reset_index(drop=True)
         self.df = df
 
     def _enforce_types(self):
         df = self.df
-        df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce")
-        df["Nature of Record"] = df["Nature of Record"].astype("string")
-        df["Amount"] = pd.to_numeric(df["Amount"], errors="coerce")
-        df["Account"] = df["Account"].astype("string")
-        df["Source"] = df["Source"].astype("string")
-        df["Description"] = df["Description"].astype("string")
-        df["Description"] = df["Description"].fillna("").astype(str)
+        timestamp = pd.to_datetime(
+            df["Timestamp"], format=self.TIMESTAMP_FORMAT, errors="coerce", cache=True
+        )
+        unparsed = timestamp.isna() & df["Timestamp"].notna()
+        if unparsed.any():
+            timestamp[unparsed] = pd.to_datetime(
+                df.loc[unparsed, "Timestamp"], format="mixed", errors="coerce"
+            )
+        df["Timestamp"] = timestamp
+
+        # sort on the parsed datetimes, never on raw text; stable, so rows sharing a
+        # Timestamp (e.g. both legs of a transfer) keep their order. Everything
+        # downstream relies on df staying in this order
+        df = df.sort_values("Timestamp", ascending=True, kind="stable").reset_index(drop=True)
+
+        df["Nature of Record"] = df["Nature of Record"].astype("category")
+        df["Account"] = df["Account"].astype("category")
+        df["Source"] = df["Source"].astype("category")
+        df["Description"] = df["Description"].astype("string[pyarrow]").fillna("")
+
+        # months since 1970-01 as one int32 key for month filters; NaT never matches a month
+        months = df["Timestamp"].to_numpy().astype("datetime64[M]")
+        df["YearMonth"] = np.where(
+            np.isnat(months), np.iinfo(np.int32).min, months.astype("int64")
+        ).astype("int32")
+        self.df = df
     
     # ---------- Visualization ----------
 
@@ -161,7 +333,7 @@ class Finance:
         all_rows = []
 
         for (year, month) in periods:
-            data = self.monthly_expense(month=month, year=year)["Amount"].copy()
+            data = self.monthly_expense(month=month, year=year)["Amount"]
 
             # --- Top N + others per month ---
             topN_series = data.head(topN)
@@ -258,11 +430,23 @@ if __name__ == "__main__":
     def load_data():
         engine = Finance()
         df = engine.run()
-        return df
+
+        # running balance per account over the whole history, so filters only slice it;
+        # df is in parsed-Timestamp order (Finance._enforce_types), which the kernel
+        # follows within each account
+        df["Balance"] = Finance.cumsum_by_group(
+            df["Account"].cat.codes.to_numpy(),
+            df["Amount"].to_numpy(),
+            len(df["Account"].cat.categories),
+        )
+
+        # current balance per account is filter-independent as well
+        balances = df.groupby("Account", observed=True)["Amount"].sum()
+        return df, balances
     
     try:
         with st.spinner("Fetching latest financial data..."):
-            df = load_data()    
+            df, balances = load_data()    
     except Exception as e:
         st.error(f"Error loading data: {e}")
         st.stop
@@ -305,13 +489,18 @@ if __name__ == "__main__":
                                                    default=transactions)
     
     # --- FILTERING DATA ---
+    # df is sorted by Timestamp (see Finance._enforce_types), so the date range
+    # is a contiguous slice found by binary search
+    timestamps = df["Timestamp"].to_numpy()
+    bounds = np.array([start_date, end_date + timedelta(days=1)], dtype="datetime64[D]")
+    lo, hi = timestamps.searchsorted(bounds.astype(timestamps.dtype))
+    window = df.iloc[lo:hi]
+
     mask = (
-        (df["Timestamp"].dt.date >= start_date) &
-        (df["Timestamp"].dt.date <= end_date) &
-        (df["Account"].isin(selected_accounts)) &
-        (df["Nature of Record"].isin(selected_transactions))
+        (window["Account"].isin(selected_accounts)) &
+        (window["Nature of Record"].isin(selected_transactions))
     )
-    filtered_df = df.loc[mask]
+    filtered_df = window.loc[mask]
 
     # --- QUICK ACTIONS ---
 
@@ -322,7 +511,7 @@ if __name__ == "__main__":
 
     with side_r1c1:
         if is_admin:
-            st.link_button("✍️ Record", Configurations.responder_link)
+            st.link_button("✍️ Record", Configurations.responder_link())
         else:
             st.caption("Login as admin for quick actions.")
 
@@ -332,8 +521,20 @@ if __name__ == "__main__":
     st.markdown("---")  
 
     # 1. KPI METRICS
-    filtered_record_totals = filtered_df.groupby("Nature of Record")["Amount"].sum().to_dict()
-    unfiltered_record_totals = df.groupby("Nature of Record")["Amount"].sum().to_dict()
+    # totals per Nature of Record as weighted bincounts over category codes,
+    # with the filtered totals reading the same arrays through the date slice and mask
+    record_types = df["Nature of Record"].cat.categories
+    record_codes = df["Nature of Record"].cat.codes.to_numpy()
+    amounts = df["Amount"].to_numpy()
+
+    def record_totals(codes, amt):
+        valid = (codes >= 0) & ~np.isnan(amt)
+        totals = np.bincount(codes[valid], weights=amt[valid], minlength=len(record_types))
+        return dict(zip(record_types, totals.tolist()))
+
+    keep = mask.to_numpy()
+    filtered_record_totals = record_totals(record_codes[lo:hi][keep], amounts[lo:hi][keep])
+    unfiltered_record_totals = record_totals(record_codes, amounts)
 
     balance = filtered_record_totals.get("Income", 0) + filtered_record_totals.get("Expense", 0)
     transfer_InOut = unfiltered_record_totals.get("Transfer-In", 0) + unfiltered_record_totals.get("Transfer-Out", 0)
@@ -364,12 +565,12 @@ if __name__ == "__main__":
     with r1c1:
         st.subheader("💸 Current Balance by Accounts")
         #current_bals = df[df['Account'].isin(selected_accounts)].groupby('Account')['Amount'].sum().reset_index()
-        fig_bar = Graph.balance_by_account_graph(df=df, selected_accounts=selected_accounts, template=Configurations.PLOTLY_TEMPLATE)
+        fig_bar = Graph.balance_by_account_graph(balances=balances, selected_accounts=selected_accounts, template=Configurations.PLOTLY_TEMPLATE)
         st.plotly_chart(fig_bar, width="stretch")
 
     with r2c2:
         st.subheader("📃 Expense Categories")
-        exp_df = filtered_df[filtered_df['Nature of Record'] == 'Expense'].copy()
+        exp_df = filtered_df[filtered_df['Nature of Record'] == 'Expense']
         if not exp_df.empty:
             fig_pie = Graph.expense_pie_topN(exp_df, topN=7, template=Configurations.PLOTLY_TEMPLATE)
             st.plotly_chart(fig_pie, width="stretch") 
@@ -380,7 +581,7 @@ if __name__ == "__main__":
 
     # 3. Balance overtime
     st.subheader("📈 Balance over time (Selected Period)")
-    fig_line = Graph.balance_overtime_graph(df, mask, template=Configurations.PLOTLY_TEMPLATE)
+    fig_line = Graph.balance_overtime_graph(filtered_df, template=Configurations.PLOTLY_TEMPLATE)
     if not filtered_df.empty:
         st.plotly_chart(fig_line, width="stretch")
     else:
@@ -388,7 +589,8 @@ if __name__ == "__main__":
     st.markdown("---")
     # Raw Data
     with st.expander("📄 View Raw Data"):
-        st.dataframe(filtered_df.sort_values('Timestamp', ascending=False).reset_index(drop=True)) 
+        # filtered_df keeps df's ascending Timestamp order, so reversing gives newest first
+        st.dataframe(filtered_df.drop(columns=["YearMonth", "Balance"]).iloc[::-1].reset_index(drop=True)) 
     
     # filtered_df.info()
     # filtered_df.head(4)
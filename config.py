@@ -1,3 +1,5 @@
+import functools
+
 import streamlit as st
 import plotly.express as px
 
@@ -23,13 +25,20 @@ class Configurations:
 
     # --- DATA ---
     
-    with open("data.txt", "r") as f:
-        URL: str = f.read()
-
-    with open("responder_link.txt", "r") as f:
-        responder_link: str = f.read()
+    @classmethod
+    @functools.cache
+    def url(cls) -> str:
+        with open("data.txt", "r") as f:
+            return f.read().strip()
+
+    @classmethod
+    @functools.cache
+    def responder_link(cls) -> str:
+        with open("responder_link.txt", "r") as f:
+            return f.read().strip()
          
     SHEET: str = "Form Responses 2"
+    CACHE_DIR: str = ".cache"
 
 
     # --- GRAPH SETTINGS ---
@@ -1,47 +1,50 @@
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 
 from config import Configurations
 
 class Graph:
     
-    def expense_pie_topN(exp_df: pd.DataFrame, template: dict, topN: int = 7) -> px.pie:
+    def expense_pie_topN(exp_df: pd.DataFrame, template: dict, topN: int = 7) -> go.Figure:
         """
         Build a donut pie of expenses by Source, showing topN sources and
         collapsing the rest into 'Others'. Returns a Plotly figure.
         """
-        # --- aggregate raw data like your original code ---
-        pie_data = (
-            exp_df.groupby("Source")["Amount"]
-            .sum()
-            .abs()
-            .sort_values(ascending=False)
-        )
+        # --- aggregate per Source as weighted bincounts over category codes ---
+        sources = exp_df["Source"].cat.categories
+        codes = exp_df["Source"].cat.codes.to_numpy()
+        amounts = exp_df["Amount"].to_numpy()
+        valid = (codes >= 0) & ~np.isnan(amounts)
+
+        sums = np.abs(np.bincount(codes[valid], weights=amounts[valid], minlength=len(sources)))
+        present = np.flatnonzero(np.bincount(codes[valid], minlength=len(sources)))
 
-        # --- Top N + Others logic (using index/value like your structure) ---
-        data = pie_data  # naming to match your snippet
+        # --- Top N + Others: partition out the N largest, then order only those ---
+        top_idx = present
+        if len(present) > topN:
+            top_idx = present[np.argpartition(-sums[present], topN)[:topN]]
+        top_idx = top_idx[np.argsort(-sums[top_idx], kind="stable")]
 
-        top = data.head(topN)
-        others_sum = data.iloc[topN:].sum()
+        total = sums[present].sum()
+        others_sum = sums[np.setdiff1d(present, top_idx)].sum()
 
-        labels = list(top.index)
-        values = list(top.values)
+        labels = list(sources[top_idx])
+        values = list(sums[top_idx])
 
         if others_sum > 0:
             labels.append("Others")
             values.append(others_sum)
 
-        df_plot = pd.DataFrame({"Account": labels, "Amount": values})
+        palette = Configurations.VIBRANT_SEQUENCE
 
         # --- Plotly pie with outside labels + legend ---
-        fig = px.pie(
-            df_plot,
-            names="Account",
-            values="Amount",
+        fig = go.Figure(go.Pie(
+            labels=labels,
+            values=values,
             hole=0.45,
-            color="Amount",
-            color_discrete_sequence=Configurations.VIBRANT_SEQUENCE
-        )
+            marker=dict(colors=[palette[i % len(palette)] for i in range(len(labels))]),
+        ))
 
         fig.update_traces(
             textposition="outside",
@@ -59,7 +62,7 @@ class Graph:
         # center total in the donut
         fig.add_annotation(
             x=0.5, y=0.5, xref="paper", yref="paper",
-            text=f"<b>Total</b><br>₹{data.sum():,.2f}",
+            text=f"<b>Total</b><br>₹{total:,.2f}",
             showarrow=False,
             font=dict(size=16, color="#ffffff"),
             align="center",
@@ -67,31 +70,24 @@ class Graph:
 
         return fig
 
-    def balance_by_account_graph(df: pd.DataFrame, selected_accounts: list[str], template: dict) -> px.bar:
+    def balance_by_account_graph(balances: pd.Series, selected_accounts: list[str], template: dict) -> go.Figure:
         """
         Build a bar chart of balances by Account for the selected_accounts,
         using a vibrant continuous color scale. Returns a Plotly figure.
+        Expects balances as the precomputed Amount total per Account.
         """
-        # aggregate balances for selected accounts
-        current_bals = (
-            df[df["Account"].isin(selected_accounts)]
-            .groupby("Account")["Amount"]
-            .sum()
-            .reset_index()
-        )
-
-        current_bals.columns = ["Account", "Amount"]
-
-        fig = px.bar(
-            current_bals,
-            x="Account",
-            y="Amount",
-            color="Amount",
-            color_continuous_scale=Configurations.VIBRANT_SCALE,
-            labels={"Amount": "Amount (₹)", "Account": "Account"},
-            text="Amount",
-            text_auto=True,
-        )
+        # pick the selected accounts out of the precomputed balances
+        current_bals = balances[balances.index.isin(selected_accounts)]
+        accounts = current_bals.index.tolist()
+        amounts = current_bals.to_numpy()
+
+        fig = go.Figure(go.Bar(
+            x=accounts,
+            y=amounts,
+            text=amounts,
+            marker=dict(color=amounts, coloraxis="coloraxis"),
+        ))
+        fig.update_layout(coloraxis_colorscale=Configurations.VIBRANT_SCALE)
 
         # labels + hover
         fig.update_traces(
@@ -135,44 +131,35 @@ class Graph:
 
         return fig
 
-    def balance_overtime_graph(df: pd.DataFrame, mask, template: dict) -> px.line:
+    def balance_overtime_graph(df: pd.DataFrame, template: dict) -> go.Figure:
         """
         Balance over time by Account.
-        Expects a long df with columns: Timestamp, Account, Amount.
-        Cumulative sum is done for all accounts, then filtered.
+        Expects an already filtered long df with columns: Timestamp, Account, Balance,
+        where Balance is the running balance per account over the full history.
+        Rows must be in Timestamp order, as Finance._enforce_types sorts them after parsing.
         """
 
-        df = df.copy()
-
-        # 1) global running balance per account (no filter yet)
-        df = df.sort_values(["Account", "Timestamp"])
-        df["Balance"] = df.groupby("Account")["Amount"].cumsum()  # groupwise cumsum [web:148][web:150]
-        
-        # 2) filter to selected accounts
-        df = df.loc[mask]
-        
-        # 3) sort for nice time-series plotting
-        df = df.sort_values("Timestamp")
-
-        fig = px.line(
-            df,
-            x="Timestamp",
-            y="Balance",
-            color="Account",
-            line_group="Account",
-            custom_data="Account",
-            labels={"Balance": "Balance (₹)", "Timestamp": "Date/Time"},
-            color_discrete_sequence=Configurations.VIBRANT_SEQUENCE,  # vibrant palette [web:140]
-        )
+        # one trace per account, coloured in order of first appearance
+        palette = Configurations.VIBRANT_SEQUENCE  # vibrant palette [web:140]
+        fig = go.Figure()
+        for i, (account, rows) in enumerate(df.groupby("Account", observed=True, sort=False)):
+            fig.add_trace(go.Scatter(
+                x=rows["Timestamp"].to_numpy(),
+                y=rows["Balance"].to_numpy(),
+                name=account,
+                legendgroup=account,
+                line=dict(color=palette[i % len(palette)]),
+            ))
 
         fig.update_traces(
             mode="lines",
             line=dict(width=2.5),
             fill="tozeroy",
             opacity=0.7,
+            showlegend=True,
             hovertemplate=(
                 "<b>Date:</b> %{x|%Y-%m-%d}<br>"
-                "<b>Account:</b> %{customdata[0]}<br>"
+                "<b>Account:</b> %{fullData.name}<br>"
                 "<b>Balance:</b> ₹%{y:,.2f}<extra></extra>"
             ),
         )